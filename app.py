@@ -5,23 +5,40 @@ Production Flask Backend
 from flask import Flask, render_template, request, jsonify, session
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import os, uuid
+from collections import OrderedDict
 from dotenv import load_dotenv
 
 load_dotenv()
 
 from models.demand_model import DemandPredictor
-from utils.ai_engine import AIEngine
+from utils.ai_engine import AIEngine, product_summary
+from utils.json_provider import ORJSONProvider
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "retailmind-secret-2025")
+app.json = ORJSONProvider(app)
 
-DATA_STORE  = {}   # sid → json string
-MODEL_STORE = {}   # sid → DemandPredictor
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", 64))
+
+DATA_STORE  = OrderedDict()   # sid → DataFrame (LRU, capped at MAX_SESSIONS)
+MODEL_STORE = {}              # sid → DemandPredictor
+PROD_STORE  = {}              # sid → product-level aggregate (see product_summary)
+RAW_STORE   = {}              # sid → Arrow table backing /api/raw_data
+RAW_ROWS    = 200
 AI          = AIEngine()
 
 REQUIRED = ["Product","Category","Units_Sold","Current_Stock","Price","Competitor_Price"]
 
+# Explicit types for the known columns (others are inferred by the Arrow reader)
+CSV_TYPES = {
+    "Product": pa.string(), "Category": pa.string(),
+    "Units_Sold": pa.float64(), "Current_Stock": pa.float64(),
+    "Price": pa.float64(), "Competitor_Price": pa.float64(),
+}
+
 def sid():
     if "sid" not in session:
         session["sid"] = str(uuid.uuid4())
@@ -29,10 +46,63 @@ def sid():
 
 # ── helpers ─────────────────────────────────────────────────────────────────
 def load_df(session_id):
-    raw = DATA_STORE.get(session_id)
-    if raw is None:
+    df = DATA_STORE.get(session_id)
+    if df is None:
         return None
-    return pd.read_json(raw, orient="records")
+    DATA_STORE.move_to_end(session_id)
+    return df
+
+def store_df(session_id, df):
+    DATA_STORE[session_id] = df
+    DATA_STORE.move_to_end(session_id)
+    while len(DATA_STORE) > MAX_SESSIONS:
+        old, _ = DATA_STORE.popitem(last=False)
+        MODEL_STORE.pop(old, None)
+        PROD_STORE.pop(old, None)
+        RAW_STORE.pop(old, None)
+        AI.forget(old)
+
+def read_csv(stream) -> pd.DataFrame:
+    """Multithreaded Arrow CSV parse; converted to pandas once, for the model.
+    Units_Sold is read as float64 so fractional values parse, then kept as int64
+    when every value is a whole number, so counts stay integers in the API."""
+    table = pacsv.read_csv(
+        stream,
+        read_options=pacsv.ReadOptions(block_size=8 << 20),
+        convert_options=pacsv.ConvertOptions(column_types=CSV_TYPES, strings_can_be_null=True),
+    )
+    df = table.to_pandas(date_as_object=False)
+    if "Units_Sold" in df.columns:
+        units = df["Units_Sold"]
+        if units.notna().all() and (units % 1 == 0).all():
+            df["Units_Sold"] = units.astype(np.int64)
+    return df
+
+def parse_dates(col: pd.Series) -> pd.Series:
+    """Parsed once at upload and kept as datetime64 in the session frame.
+    ISO-8601 takes the vectorized path; only the values it could not read
+    fall back to inference."""
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col
+    dates = pd.to_datetime(col, format="ISO8601", errors="coerce", cache=True)
+    if dates.isna().sum() > col.isna().sum():
+        dates = dates.fillna(pd.to_datetime(col.where(dates.isna()), errors="coerce", cache=True))
+    return dates
+
+def raw_preview(df) -> pa.Table:
+    """First RAW_ROWS rows as Arrow; NaN/NaT become null, shown as a dash in the table.
+    Datetimes are pinned to millisecond precision so to_pylist() yields plain datetimes
+    (ISO strings in the response) whichever parser produced the column."""
+    cols = [c for c in df.columns if c not in ("Day","Month","Year")]
+    head = df[cols].head(RAW_ROWS)
+    dts  = [c for c in cols if pd.api.types.is_datetime64_dtype(head[c])]
+    if dts:
+        head = head.astype({c: "datetime64[ms]" for c in dts})
+    return pa.Table.from_pandas(head, preserve_index=False)
+
+def cols_payload(df) -> dict:
+    """Column-oriented chart payload: {"columns": [...], "data": [[row], ...]}."""
+    return {"columns": list(df.columns), "data": df.values.tolist()}
 
 def safe_int(v):
     try: return int(v)
@@ -56,7 +126,7 @@ def upload():
     if not f.filename.endswith(".csv"):
         return jsonify({"error": "Only CSV files accepted"}), 400
     try:
-        df = pd.read_csv(f)
+        df = read_csv(f.stream)
     except Exception as e:
         return jsonify({"error": f"CSV parse error: {e}"}), 400
 
@@ -66,17 +136,20 @@ def upload():
 
     # Date features
     if "Date" in df.columns:
-        df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-        df["Day"]   = df["Date"].dt.day.fillna(1).astype(int)
-        df["Month"] = df["Date"].dt.month.fillna(1).astype(int)
-        df["Year"]  = df["Date"].dt.year.fillna(2024).astype(int)
+        df["Date"]  = parse_dates(df["Date"])
+        df["Day"]   = df["Date"].dt.day.fillna(1).astype(np.int16)
+        df["Month"] = df["Date"].dt.month.fillna(1).astype(np.int16)
+        df["Year"]  = df["Date"].dt.year.fillna(2024).astype(np.int16)
     else:
         df["Day"] = 1; df["Month"] = 1; df["Year"] = 2024
 
     pred = DemandPredictor()
     df   = pred.fit_predict(df)
     MODEL_STORE[s] = pred
-    DATA_STORE[s]  = df.to_json(orient="records", date_format="iso")
+    PROD_STORE[s]  = product_summary(df)
+    RAW_STORE[s]   = raw_preview(df)
+    store_df(s, df)
+    AI.forget(s)
 
     return jsonify({
         "success": True,
@@ -95,13 +168,7 @@ def dashboard():
     if df is None: return jsonify({"error":"No data"}), 400
 
     # KPIs
-    prod = df.groupby("Product").agg(
-        sold=("Units_Sold","sum"),
-        stock=("Current_Stock","mean"),
-        demand=("Predicted_Demand","mean"),
-        price=("Price","mean"),
-        comp=("Competitor_Price","mean"),
-    ).reset_index()
+    prod = PROD_STORE[s]
 
     critical = int((prod["stock"] < prod["demand"] * 0.7).sum())
     kpis = {
@@ -115,24 +182,24 @@ def dashboard():
     }
 
     # Charts data
-    top20 = prod.sort_values("sold", ascending=False).head(20)
-    demand_stock = top20[["Product","sold","stock","demand"]].to_dict(orient="records")
+    top20 = prod.head(20)
+    demand_stock = cols_payload(top20[["Product","sold","stock","demand"]])
 
     cat = df.groupby("Category")["Units_Sold"].sum().reset_index()
     cat.columns = ["category","sales"]
 
-    daily = []
+    daily = {"columns": ["date","sales"], "data": []}
     if "Date" in df.columns:
-        df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-        d = df.dropna(subset=["Date"]).groupby(df["Date"].dt.date)["Units_Sold"].sum()
-        daily = [{"date": str(k), "sales": int(v)} for k,v in d.items()]
+        # datetime64 day buckets group on int64 keys, not Python date objects
+        d = df["Units_Sold"].groupby(df["Date"].dt.floor("D")).sum()
+        daily["data"] = [list(r) for r in zip(d.index.strftime("%Y-%m-%d"), d.to_numpy().astype(int).tolist())]
 
-    price_cmp = prod.sort_values("price").head(20)[["Product","price","comp"]].to_dict(orient="records")
+    price_cmp = cols_payload(prod.sort_values("price").head(20)[["Product","price","comp"]])
 
     return jsonify({
         "kpis": kpis,
         "demand_stock": demand_stock,
-        "category_sales": cat.to_dict(orient="records"),
+        "category_sales": cols_payload(cat),
         "daily_trend": daily,
         "price_comparison": price_cmp,
     })
@@ -142,7 +209,7 @@ def decisions():
     s = sid()
     df = load_df(s)
     if df is None: return jsonify({"error":"No data"}), 400
-    result = AI.generate_decisions(df)
+    result = AI.generate_decisions(df, PROD_STORE[s], sid=s)
     return jsonify(result)
 
 @app.route("/api/insights")
@@ -150,7 +217,15 @@ def insights():
     s = sid()
     df = load_df(s)
     if df is None: return jsonify({"error":"No data"}), 400
-    result = AI.generate_insights(df)
+    result = AI.generate_insights(df, PROD_STORE[s], sid=s)
+    return jsonify(result)
+
+@app.route("/api/bundle")
+def bundle():
+    s = sid()
+    df = load_df(s)
+    if df is None: return jsonify({"error":"No data"}), 400
+    result = AI.generate_bundle(df, PROD_STORE[s], sid=s)
     return jsonify(result)
 
 @app.route("/api/copilot", methods=["POST"])
@@ -161,7 +236,7 @@ def copilot():
     body = request.get_json() or {}
     q = body.get("question","").strip()
     if not q: return jsonify({"error":"Empty question"}), 400
-    answer = AI.copilot(q, df)
+    answer = AI.copilot(q, df, PROD_STORE[s], sid=s)
     return jsonify({"answer": answer})
 
 @app.route("/api/raw_data")
@@ -169,8 +244,7 @@ def raw_data():
     s = sid()
     df = load_df(s)
     if df is None: return jsonify({"error":"No data"}), 400
-    cols = [c for c in df.columns if c not in ("Day","Month","Year")]
-    return jsonify(df[cols].head(200).fillna("").to_dict(orient="records"))
+    return jsonify(RAW_STORE[s].to_pylist())
 
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
@@ -1,29 +1,47 @@
 """
 Demand Prediction Model
-Ensemble: Gradient Boosting + Random Forest (CPU-friendly, production-grade)
+Ensemble: Histogram Gradient Boosting + Random Forest / Ridge (CPU-friendly, production-grade)
 Falls back to TF MLP when enough data exists.
 All technical internals — never exposed to the UI.
 """
+import importlib.util
 import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.preprocessing import LabelEncoder
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Ridge
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score
 import warnings; warnings.filterwarnings("ignore")
 
-try:
-    import tensorflow as tf
-    from tensorflow import keras
-    TF_AVAILABLE = True
-except:
-    TF_AVAILABLE = False
+from utils.grouping import group_agg, group_codes
+
+# Probed, not imported: TensorFlow costs seconds and tens of MB, and only the
+# MLP path (25+ products) needs it — see DemandPredictor._load_tf.
+TF_AVAILABLE = importlib.util.find_spec("tensorflow") is not None
+
+
+def _precision_policy(tf) -> str:
+    """fp16 on GPU, bf16 on CPUs with native bf16 math, plain float32 otherwise."""
+    if tf.config.list_physical_devices("GPU"):
+        return "mixed_float16"
+    try:
+        with open("/proc/cpuinfo") as f:
+            if "avx512_bf16" in f.read():
+                return "mixed_bfloat16"
+    except OSError:
+        pass
+    return "float32"
 
 
 class DemandPredictor:
+    _tf    = None   # tensorflow / keras modules, imported on first MLP fit
+    _keras = None
+
     def __init__(self):
         self.model        = None
-        self.scaler       = StandardScaler()
+        self.mu_          = None  # feature means / stds (train split) for z-scoring
+        self.sd_          = None
         self.label_enc    = LabelEncoder()
         self.feat_names   = []
         self.metrics_     = {}
@@ -31,29 +49,47 @@ class DemandPredictor:
         self._prod_map    = {}  # product → predicted demand
 
     def _features(self, df: pd.DataFrame, fit=False) -> np.ndarray:
-        d = df.copy()
-        cats = d["Category"].fillna("Other")
-        if fit:
-            self.label_enc.fit(cats)
-        d["cat_enc"] = self.label_enc.transform(cats)
-
-        d["log_stock"] = np.log1p(d["Current_Stock"].clip(0))
-        d["log_price"] = np.log1p(d["Price"].clip(0))
-        d["log_comp"]  = np.log1p(d["Competitor_Price"].clip(0))
-        d["price_sens"]= d["Price"] / (d["Competitor_Price"] + 1e-6)
-        d["price_gap"] = d["Competitor_Price"] - d["Price"]
-        d["stk_price"] = d["Current_Stock"] / (d["Price"] + 1e-6)
-        d["m_sin"]     = np.sin(2 * np.pi * d["Month"] / 12)
-        d["m_cos"]     = np.cos(2 * np.pi * d["Month"] / 12)
-
+        # Written column-by-column into one float32 matrix; the frame is never copied.
         self.feat_names = [
             "log_stock","log_price","log_comp","cat_enc",
             "m_sin","m_cos","price_sens","price_gap","stk_price"
         ]
-        X = d[self.feat_names].values.astype(np.float32)
-        return np.nan_to_num(X, nan=0., posinf=0., neginf=0.)
+        cats = df["Category"].fillna("Other").to_numpy()
+        if fit:
+            self.label_enc.fit(cats)
+
+        stock = df["Current_Stock"].to_numpy(dtype=np.float64, na_value=np.nan)
+        price = df["Price"].to_numpy(dtype=np.float64, na_value=np.nan)
+        comp  = df["Competitor_Price"].to_numpy(dtype=np.float64, na_value=np.nan)
+        month = df["Month"].to_numpy(dtype=np.float64, na_value=np.nan) * (2 * np.pi / 12)
+
+        X = np.empty((len(df), len(self.feat_names)), dtype=np.float32)
+        np.log1p(np.clip(stock, 0, None), out=X[:,0])
+        np.log1p(np.clip(price, 0, None), out=X[:,1])
+        np.log1p(np.clip(comp,  0, None), out=X[:,2])
+        X[:,3] = self.label_enc.transform(cats)
+        np.sin(month, out=X[:,4])
+        np.cos(month, out=X[:,5])
+        np.divide(price, comp + 1e-6, out=X[:,6])
+        np.subtract(comp, price, out=X[:,7])
+        np.divide(stock, price + 1e-6, out=X[:,8])
+        return np.nan_to_num(X, copy=False, nan=0., posinf=0., neginf=0.)
+
+    @classmethod
+    def _load_tf(cls) -> bool:
+        global TF_AVAILABLE
+        if cls._tf is None and TF_AVAILABLE:
+            try:
+                import tensorflow as tf
+                from tensorflow import keras
+                cls._tf, cls._keras = tf, keras
+            except Exception:
+                TF_AVAILABLE = False
+        return cls._tf is not None
 
     def _build_mlp(self, dim):
+        keras = self._keras
+        keras.mixed_precision.set_global_policy(_precision_policy(self._tf))
         inp = keras.Input(shape=(dim,))
         x = keras.layers.Dense(256, activation="relu",
                                kernel_regularizer=keras.regularizers.l2(1e-4))(inp)
@@ -64,15 +100,17 @@ class DemandPredictor:
         x = keras.layers.Dropout(0.2)(x)
         x = keras.layers.Dense(64, activation="relu")(x)
         x = keras.layers.Dropout(0.1)(x)
-        x = keras.layers.Dense(1)(x)
+        x = keras.layers.Dense(1, dtype="float32")(x)   # regression head stays fp32
         m = keras.Model(inp, x)
-        m.compile(optimizer=keras.optimizers.Adam(5e-4), loss="huber", metrics=["mae"])
+        m.compile(optimizer=keras.optimizers.Adam(5e-4), loss="huber", metrics=["mae"],
+                  jit_compile=True)
         return m
 
     def fit_predict(self, df: pd.DataFrame) -> pd.DataFrame:
-        df = df.copy()
+        """Fits on the product-level aggregate and adds Predicted_Demand to df in place."""
         # Aggregate to product level (avoids repeated-row bias)
-        agg = df.groupby("Product").agg(
+        keys = group_codes(df["Product"])
+        agg  = group_agg(df, "Product", codes=keys,
             Category=("Category","first"),
             Current_Stock=("Current_Stock","mean"),
             Price=("Price","mean"),
@@ -80,7 +118,7 @@ class DemandPredictor:
             Month=("Month","median"),
             Day=("Day","median"),
             Units_Sold=("Units_Sold","mean"),
-        ).reset_index()
+        )
 
         n = len(agg)
         if n < 4:
@@ -92,19 +130,26 @@ class DemandPredictor:
         y    = np.clip(agg["Units_Sold"].values.astype(np.float32), 0, None)
         test = min(0.2, max(0.15, 10/n))
 
-        X_tr, X_te, y_tr, y_te = (train_test_split(X, y, test_size=test, random_state=42)
-                                   if n >= 10 else (X, X, y, y))
+        idx    = np.arange(n)
+        tr, te = (train_test_split(idx, test_size=test, random_state=42)
+                  if n >= 10 else (idx, idx))
+
+        # z-score with train-split statistics, applied once, in place, to the whole matrix
+        self.mu_ = X[tr].mean(axis=0, dtype=np.float64)
+        self.sd_ = X[tr].std(axis=0, dtype=np.float64)
+        self.sd_[self.sd_ == 0] = 1.
+        X -= self.mu_; X /= self.sd_
 
-        X_tr_s = self.scaler.fit_transform(X_tr)
-        X_te_s = self.scaler.transform(X_te)
-        X_all  = self.scaler.transform(X)
+        X_all = X
+        X_tr_s, X_te_s, y_tr, y_te = X[tr], X[te], y[tr], y[te]
 
         imp = {}
-        if TF_AVAILABLE and n >= 25:
+        if TF_AVAILABLE and n >= 25 and self._load_tf():
+            keras = self._keras
             m = self._build_mlp(X_tr_s.shape[1])
             vs = 0.15 if len(X_tr_s) > 20 else 0.0
             m.fit(X_tr_s, y_tr,
-                  epochs=min(200, n*4), batch_size=max(4, min(16, n//4)),
+                  epochs=min(200, n*4), batch_size=min(256, max(32, n//8)),
                   validation_split=vs,
                   callbacks=[
                       keras.callbacks.EarlyStopping(patience=15, restore_best_weights=True,
@@ -113,21 +158,36 @@ class DemandPredictor:
                   ], verbose=0)
             self.model = m
             p_all = np.clip(m.predict(X_all, verbose=0).flatten(), 0, None)
-            p_te  = np.clip(m.predict(X_te_s, verbose=0).flatten(), 0, None)
-            # permutation importance
+            p_te  = p_all[te]
+            # permutation importance — all permuted copies scored in one predict call
             base = mean_absolute_error(y_te, p_te)
-            for i, fn in enumerate(self.feat_names):
-                Xp = X_te_s.copy(); np.random.shuffle(Xp[:,i])
-                imp[fn] = max(0., mean_absolute_error(y_te, m.predict(Xp, verbose=0).flatten()) - base)
+            nfeat, ntest = len(self.feat_names), len(X_te_s)
+            perm  = np.random.permutation(ntest)          # one row order shared by all features
+            X_big = np.repeat(X_te_s[None, :, :], nfeat, axis=0)
+            for i in range(nfeat):
+                X_big[i, :, i] = X_te_s[perm, i]
+            preds = m.predict(X_big.reshape(nfeat * ntest, -1), batch_size=4096,
+                              verbose=0).reshape(nfeat, ntest)
+            drops = np.mean(np.abs(y_te[None, :] - preds), axis=1) - base
+            imp   = {fn: max(0., float(d)) for fn, d in zip(self.feat_names, drops)}
         else:
-            gb = GradientBoostingRegressor(n_estimators=300, max_depth=4,
-                                           learning_rate=0.03, subsample=0.8, random_state=42)
-            rf = RandomForestRegressor(n_estimators=200, random_state=42, n_jobs=-1)
-            gb.fit(X_tr_s, y_tr); rf.fit(X_tr_s, y_tr)
-            self.model = (gb, rf)
-            p_all = np.clip(gb.predict(X_all)*0.6 + rf.predict(X_all)*0.4, 0, None)
-            p_te  = np.clip(gb.predict(X_te_s)*0.6 + rf.predict(X_te_s)*0.4, 0, None)
-            imp   = dict(zip(self.feat_names, gb.feature_importances_))
+            # histogram GBM: multithreaded, binned splits (vs. exact tree-by-tree GB)
+            gb = HistGradientBoostingRegressor(max_iter=300, max_depth=4, learning_rate=0.03,
+                                               min_samples_leaf=1, early_stopping=False,
+                                               random_state=42)
+            # second ensemble member sized to the data: a forest adds little on tiny sets
+            if n < 25:
+                aux = Ridge(alpha=1.0)
+            else:
+                n_rf = 50 if n < 50 else 100 if n < 200 else 200
+                aux  = RandomForestRegressor(n_estimators=n_rf, max_depth=8, max_features="sqrt",
+                                             max_samples=0.8, random_state=42, n_jobs=-1)
+            gb.fit(X_tr_s, y_tr); aux.fit(X_tr_s, y_tr)
+            self.model = (gb, aux)
+            p_all = np.clip(gb.predict(X_all)*0.6 + aux.predict(X_all)*0.4, 0, None)
+            p_te  = p_all[te]
+            w     = aux.feature_importances_ if n >= 25 else np.abs(aux.coef_)
+            imp   = dict(zip(self.feat_names, w))
 
         mae = float(mean_absolute_error(y_te, p_te))
         r2  = float(r2_score(y_te, p_te)) if len(y_te)>1 else 1.
@@ -136,6 +196,7 @@ class DemandPredictor:
         tot = sum(imp.values()) + 1e-9
         self.importances_ = {k: round(v/tot*100,1) for k,v in sorted(imp.items(), key=lambda x:-x[1])}
 
-        prod_pred = dict(zip(agg["Product"].values, p_all))
-        df["Predicted_Demand"] = df["Product"].map(prod_pred).fillna(df["Units_Sold"])
+        # agg rows are in code order, so per-row demand is a gather by product code
+        codes = keys[0]
+        df["Predicted_Demand"] = np.where(codes >= 0, p_all[codes], df["Units_Sold"].to_numpy())
         return df
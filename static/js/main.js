@@ -179,6 +179,12 @@ const baseOpts = (extra={}) => ({
   ...extra,
 });
 
+// dashboard series arrive column-oriented: {columns:[...], data:[[row],...]}
+function col(p, name) {
+  const i = p.columns.indexOf(name);
+  return p.data.map(r => r[i]);
+}
+
 function destroy(id) {
   if (S.charts[id]) { S.charts[id].destroy(); delete S.charts[id]; }
 }
@@ -186,17 +192,17 @@ function destroy(id) {
 function renderDemandChart(data) {
   destroy('demand');
   const ctx = document.getElementById('cDemand')?.getContext('2d');
-  if (!ctx||!data?.length) return;
+  if (!ctx||!data?.data?.length) return;
   S.charts['demand'] = new Chart(ctx, {
     type:'bar',
     data:{
-      labels: data.map(d=>d.Product?.substring(0,14)),
+      labels: col(data,'Product').map(p=>String(p).substring(0,14)),
       datasets:[
-        { label:'Units Sold', data:data.map(d=>d.sold),
+        { label:'Units Sold', data:col(data,'sold'),
           backgroundColor:'rgba(99,102,241,0.7)', borderRadius:3, borderSkipped:false },
-        { label:'Current Stock', data:data.map(d=>d.stock),
+        { label:'Current Stock', data:col(data,'stock'),
           backgroundColor:'rgba(168,85,247,0.6)', borderRadius:3, borderSkipped:false },
-        { label:'AI Predicted Demand', data:data.map(d=>d.demand),
+        { label:'AI Predicted Demand', data:col(data,'demand'),
           backgroundColor:'rgba(16,185,129,0.5)', borderRadius:3, borderSkipped:false },
       ],
     },
@@ -207,14 +213,14 @@ function renderDemandChart(data) {
 function renderCatChart(data) {
   destroy('cat');
   const ctx = document.getElementById('cCat')?.getContext('2d');
-  if (!ctx||!data?.length) return;
+  if (!ctx||!data?.data?.length) return;
   const colors = ['#6366f1','#a855f7','#ec4899','#10b981','#f97316','#3b82f6','#eab308','#14b8a6'];
   S.charts['cat'] = new Chart(ctx, {
     type:'doughnut',
     data:{
-      labels: data.map(d=>d.category),
-      datasets:[{ data:data.map(d=>d.sales),
-        backgroundColor: colors.slice(0,data.length),
+      labels: col(data,'category'),
+      datasets:[{ data:col(data,'sales'),
+        backgroundColor: colors.slice(0,data.data.length),
         borderColor:'#05060f', borderWidth:3 }],
     },
     options:{
@@ -232,7 +238,7 @@ function renderTrendChart(data) {
   destroy('trend');
   const ctx = document.getElementById('cTrend')?.getContext('2d');
   if (!ctx) return;
-  if (!data?.length) {
+  if (!data?.data?.length) {
     ctx.fillStyle=C.text; ctx.font='13px Inter'; ctx.textAlign='center';
     ctx.fillText('No date column in your dataset', ctx.canvas.width/2, ctx.canvas.height/2);
     return;
@@ -242,8 +248,8 @@ function renderTrendChart(data) {
   S.charts['trend'] = new Chart(ctx, {
     type:'line',
     data:{
-      labels: data.map(d=>d.date),
-      datasets:[{ label:'Daily Sales', data:data.map(d=>d.sales),
+      labels: col(data,'date'),
+      datasets:[{ label:'Daily Sales', data:col(data,'sales'),
         borderColor:C.p1, backgroundColor:grad, borderWidth:2,
         fill:true, tension:0.4, pointRadius:0, pointHoverRadius:5 }],
     },
@@ -254,14 +260,14 @@ function renderTrendChart(data) {
 function renderPriceChart(data) {
   destroy('price');
   const ctx = document.getElementById('cPrice')?.getContext('2d');
-  if (!ctx||!data?.length) return;
+  if (!ctx||!data?.data?.length) return;
   S.charts['price'] = new Chart(ctx, {
     type:'line',
     data:{
-      labels: data.map(d=>d.Product?.substring(0,12)),
+      labels: col(data,'Product').map(p=>String(p).substring(0,12)),
       datasets:[
-        { label:'Your Price', data:data.map(d=>d.price), borderColor:C.p1, borderWidth:2, tension:0.3, pointRadius:3 },
-        { label:'Competitor', data:data.map(d=>d.comp),  borderColor:'#ef4444', borderWidth:2, tension:0.3,
+        { label:'Your Price', data:col(data,'price'), borderColor:C.p1, borderWidth:2, tension:0.3, pointRadius:3 },
+        { label:'Competitor', data:col(data,'comp'),  borderColor:'#ef4444', borderWidth:2, tension:0.3,
           pointRadius:3, borderDash:[5,5] },
       ],
     },
@@ -0,0 +1,56 @@
+import json
+
+import pandas as pd
+
+from utils.ai_engine import AIEngine, product_summary
+
+
+def _catalog(names):
+    n = len(names)
+    df = pd.DataFrame({
+        "Product":          names,
+        "Category":         ["Grocery"] * n,
+        "Units_Sold":       list(range(n, 0, -1)),
+        "Current_Stock":    [10.] * n,
+        "Predicted_Demand": [5.] * n,
+        "Price":            [2.] * n,
+        "Competitor_Price": [2.5] * n,
+    })
+    return df, product_summary(df)
+
+
+def _prompted_products(question, df, prod):
+    """Products listed in the copilot prompt for `question`."""
+    ai, prompts = AIEngine(), []
+
+    def fake_call(system, user, **kw):
+        prompts.append(user)
+        return '{"answer": "ok"}'
+
+    ai._call = fake_call
+    ai.copilot(question, df, prod)
+    data = prompts[0].split("PRODUCT DATA (JSON array):\n")[1].split("\n\nOwner's question")[0]
+    return [row["product"] for row in json.loads(data)]
+
+
+def test_question_words_do_not_fuzzy_match_short_names():
+    df, prod = _catalog(["Rice", "Milk", "Bread"])
+    assert AIEngine()._mentioned_products("Which products have the best price?", prod) == []
+    assert len(_prompted_products("Which products have the best price?", df, prod)) == 3
+
+
+def test_misspelt_long_name_still_matches():
+    df, prod = _catalog(["Chocolate", "Milk"])
+    assert AIEngine()._mentioned_products("how are chocolte sales?", prod) == ["Chocolate"]
+
+
+def test_comparison_question_keeps_the_full_catalogue():
+    df, prod = _catalog([f"Item {i}" for i in range(41)] + ["Milk"])
+    listed = _prompted_products("How is Milk doing compared to my other products?", df, prod)
+    assert listed[0] == "Milk" and len(listed) == 42
+
+
+def test_single_product_question_sends_a_focused_list():
+    df, prod = _catalog([f"Item {i}" for i in range(41)] + ["Milk"])
+    listed = _prompted_products("How is Milk doing?", df, prod)
+    assert listed[0] == "Milk" and len(listed) == 21
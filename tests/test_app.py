@@ -0,0 +1,26 @@
+import io
+
+import pandas as pd
+
+from app import app, parse_dates, raw_preview, read_csv
+
+
+def test_parse_dates_only_falls_back_for_values_iso_could_not_read():
+    dates = parse_dates(pd.Series(["2024-01-01", "01/02/2024", "2024-01-03 10:00", None]))
+    assert list(dates[:3]) == [pd.Timestamp("2024-01-01"), pd.Timestamp("2024-01-02"),
+                               pd.Timestamp("2024-01-03 10:00")]
+    assert pd.isna(dates[3])
+
+
+def test_raw_preview_dates_are_iso_whatever_the_column_unit():
+    frame = pd.DataFrame({"Date": pd.to_datetime(["2024-01-01", None]), "Day": [1, 1]})
+    for unit in ("datetime64[ns]", "datetime64[ms]"):
+        with app.app_context():
+            body = app.json.dumps(raw_preview(frame.astype({"Date": unit})).to_pylist())
+        assert body == '[{"Date":"2024-01-01T00:00:00"},{"Date":null}]'
+
+
+def test_read_csv_keeps_whole_unit_counts_as_integers():
+    csv = b"Product,Category,Units_Sold,Current_Stock,Price,Competitor_Price\nA,X,3,1,2.5,3\nB,X,4,2,1,1\n"
+    assert read_csv(io.BytesIO(csv))["Units_Sold"].dtype == "int64"
+    assert read_csv(io.BytesIO(csv.replace(b",4,", b",4.5,")))["Units_Sold"].dtype == "float64"
@@ -5,24 +5,66 @@ Single class that wraps Groq LLM for all three AI surfaces:
   • generate_decisions()  — per-product AI action cards
   • generate_insights()   — full business health narrative
   • copilot()             — conversational Q&A over live data
+  • generate_bundle()     — decisions + insights, both LLM calls in flight at once
 
 The LLM receives rich, structured data context and returns JSON responses
 that the frontend renders. No rule-based logic anywhere in this file.
 """
 
-import os, json, textwrap
+import os, re, time, difflib, textwrap, asyncio
+from collections import OrderedDict
+import orjson
 import pandas as pd
 import numpy as np
-from groq import Groq
+from groq import Groq, AsyncGroq
+
+from utils.grouping import group_agg
 
 _MODEL   = "llama-3.1-8b-instant"
 _MODEL_H = "llama3-70b-8192"   # heavier model for insights/decisions
 
+_ANSWER_CACHE = 512   # copilot answers kept (LRU)
+_FOCUS_ROWS   = 20    # top sellers sent alongside the products a question names
+
+# ordinary question words that must never resolve to a product by spelling alone
+_STOP_WORDS = {"price","prices","pricing","stock","stocks","sales","sale","sold","items",
+               "item","product","products","store","demand","revenue","category","categories"}
+# questions that need the wider catalogue even when they name a product
+_COMPARE = re.compile(r"\b(compar\w*|vs|versus|other|others|rest|all|every|than|rank\w*|"
+                      r"best|worst|top|bottom)\b")
+_ANSWER_TTL   = 600   # seconds before a cached answer is asked again
+
+
+def product_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """Product-level aggregate shared by the dashboard and every AI surface.
+    Sorted by units sold (best sellers first) so callers can just .head(n)."""
+    return group_agg(df, "Product",
+        category  = ("Category","first"),
+        sold      = ("Units_Sold","sum"),
+        stock     = ("Current_Stock","mean"),
+        demand    = ("Predicted_Demand","mean"),
+        price     = ("Price","mean"),
+        comp      = ("Competitor_Price","mean"),
+    ).sort_values("sold", ascending=False)
+
+
 class AIEngine:
     def __init__(self):
         key = os.environ.get("GROQ_API_KEY", "")
+        self._key   = key
         self.client = Groq(api_key=key) if key else None
         self._use_heavy = True   # flip to False if rate-limited
+        self._ctx_cache = {}     # (sid, max_products) → (row count, context string)
+        self._names     = {}     # sid → (lowercase name → product, name matcher)
+        self._answers   = OrderedDict()   # (sid, row count, question) → (time, answer)
+
+    def forget(self, sid: str):
+        """Drop cached context and answers for a session (new upload or eviction)."""
+        for key in [k for k in self._ctx_cache if k[0] == sid]:
+            del self._ctx_cache[key]
+        for key in [k for k in self._answers if k[0] == sid]:
+            del self._answers[key]
+        self._names.pop(sid, None)
 
     # ── low-level LLM caller ─────────────────────────────────────────────────
     def _call(self, system: str, user: str, max_tokens=1800, heavy=False) -> str:
@@ -48,44 +90,115 @@ class AIEngine:
                 return self._call(system, user, max_tokens, heavy=False)
             raise e
 
-    # ── data summariser (shared) ─────────────────────────────────────────────
-    @staticmethod
-    def _build_product_context(df: pd.DataFrame, max_products=60) -> str:
-        prod = df.groupby("Product").agg(
-            category  = ("Category","first"),
-            sold      = ("Units_Sold","sum"),
-            stock     = ("Current_Stock","mean"),
-            demand    = ("Predicted_Demand","mean"),
-            price     = ("Price","mean"),
-            comp      = ("Competitor_Price","mean"),
-        ).reset_index().sort_values("sold", ascending=False).head(max_products)
-
-        rows = []
-        for _, r in prod.iterrows():
-            stock_cover = round(r["stock"] / max(r["demand"], 1) * 100, 0)
-            price_gap   = round((r["price"] - r["comp"]) / max(r["comp"], 1) * 100, 1)
-            rows.append(
-                f'  {{"product":"{r["Product"]}","category":"{r["category"]}",'
-                f'"sold":{int(r["sold"])},"stock":{round(r["stock"],0)},'
-                f'"predicted_demand":{round(r["demand"],1)},"stock_coverage_pct":{stock_cover},'
-                f'"price":{round(r["price"],2)},"competitor_price":{round(r["comp"],2)},'
-                f'"price_gap_pct":{price_gap}}}'
+    async def _acall(self, client, system: str, user: str, max_tokens=1800, heavy=False) -> str:
+        """Async twin of _call, on a caller-owned AsyncGroq client."""
+        if client is None:
+            raise RuntimeError("GROQ_API_KEY not set")
+        model = (_MODEL_H if heavy and self._use_heavy else _MODEL)
+        try:
+            rsp = await client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role":"system","content": system},
+                    {"role":"user",  "content": user},
+                ],
+                temperature=0.3,
+                max_tokens=max_tokens,
+                response_format={"type":"json_object"},
             )
+            return rsp.choices[0].message.content
+        except Exception as e:
+            if heavy:
+                self._use_heavy = False
+                return await self._acall(client, system, user, max_tokens, heavy=False)
+            raise e
+
+    # ── data summariser (shared) ─────────────────────────────────────────────
+    def _build_product_context(self, df: pd.DataFrame, prod=None, max_products=60, sid=None,
+                               first=None) -> str:
+        """`first` lists those product names ahead of the top sellers (never cached)."""
+        key = (sid, max_products)
+        hit = self._ctx_cache.get(key) if sid and first is None else None
+        if hit and hit[0] == len(df):
+            return hit[1]
+
+        if prod is None:
+            prod = product_summary(df)
+        total_products = len(prod)
+        if first is not None:
+            named = prod["Product"].isin(first)
+            prod  = pd.concat([prod[named], prod[~named].head(max(0, max_products - int(named.sum())))])
+        else:
+            prod = prod.head(max_products)
+
+        rows = pd.DataFrame({
+            "product":            prod["Product"],
+            "category":           prod["category"],
+            "sold":               prod["sold"].astype(int),
+            "stock":              prod["stock"].round(0),
+            "predicted_demand":   prod["demand"].round(1),
+            "stock_coverage_pct": (prod["stock"] / prod["demand"].clip(lower=1) * 100).round(0),
+            "price":              prod["price"].round(2),
+            "competitor_price":   prod["comp"].round(2),
+            "price_gap_pct":      ((prod["price"] - prod["comp"]) / prod["comp"].clip(lower=1) * 100).round(1),
+        })
         store_kpis = (
-            f"total_products={df['Product'].nunique()}, "
+            f"total_products={total_products}, "
             f"categories={df['Category'].nunique()}, "
             f"total_units_sold={int(df['Units_Sold'].sum())}, "
             f"avg_stock={round(df['Current_Stock'].mean(),1)}, "
             f"avg_predicted_demand={round(df['Predicted_Demand'].mean(),1)}"
         )
-        return f"STORE KPIs: {store_kpis}\n\nPRODUCT DATA (JSON array):\n[\n" + ",\n".join(rows) + "\n]"
+        context = f"STORE KPIs: {store_kpis}\n\nPRODUCT DATA (JSON array):\n" + rows.to_json(orient="records")
+        if sid and first is None:
+            self._ctx_cache[key] = (len(df), context)
+        return context
+
+    # ── product mentions (copilot prompt slicing) ───────────────────────────
+    def _product_index(self, prod: pd.DataFrame, sid=None) -> tuple:
+        hit = self._names.get(sid) if sid else None
+        if hit is not None:
+            return hit
+        lookup = {str(p).lower(): p for p in prod["Product"] if str(p).strip()}
+        alts   = sorted(map(re.escape, lookup), key=len, reverse=True)   # longest name wins
+        pat    = re.compile(r"(?<!\w)(?:" + "|".join(alts) + r")(?!\w)") if alts else None
+        if sid:
+            self._names[sid] = (lookup, pat)
+        return lookup, pat
+
+    def _mentioned_products(self, question: str, prod: pd.DataFrame, sid=None, limit=5) -> list:
+        """Products named in the question — exact match first, then close spellings
+        of longer names (short names like "Rice" would catch words like "price")."""
+        lookup, pat = self._product_index(prod, sid)
+        q    = question.lower()
+        hits = [lookup[m] for m in pat.findall(q)] if pat else []
+        if not hits:
+            longer = [name for name in lookup if len(name) >= 6]
+            for word in re.findall(r"\w[\w'&-]{5,}", q):
+                if word not in _STOP_WORDS:
+                    hits += [lookup[m] for m in difflib.get_close_matches(word, longer, n=2, cutoff=0.85)]
+        return list(dict.fromkeys(hits))[:limit]
 
     # ═════════════════════════════════════════════════════════════════════════
     # 1. AI DECISIONS
     # ═════════════════════════════════════════════════════════════════════════
-    def generate_decisions(self, df: pd.DataFrame) -> list:
-        context = self._build_product_context(df)
+    def generate_decisions(self, df: pd.DataFrame, prod=None, sid=None) -> list:
+        context = self._build_product_context(df, prod, sid=sid)
+        try:
+            raw = self._call(*self._decisions_prompt(context), max_tokens=4000, heavy=True)
+            return self._parse_decisions(raw)
+        except Exception as e:
+            return self._decisions_error(e)
+
+    async def _adecisions(self, client, context: str) -> list:
+        try:
+            raw = await self._acall(client, *self._decisions_prompt(context), max_tokens=4000, heavy=True)
+            return self._parse_decisions(raw)
+        except Exception as e:
+            return self._decisions_error(e)
 
+    @staticmethod
+    def _decisions_prompt(context: str) -> tuple:
         system = textwrap.dedent("""
             You are an expert retail business analyst AI.
             Your job: analyze each product's inventory and pricing data and generate 
@@ -116,27 +229,44 @@ class AIEngine:
         """).strip()
 
         user = f"Analyze this retail store data and generate decisions for every product:\n\n{context}"
+        return system, user
 
-        try:
-            raw  = self._call(system, user, max_tokens=4000, heavy=True)
-            data = json.loads(raw)
-            decisions = data.get("decisions", [])
-            # sort by priority
-            decisions.sort(key=lambda x: x.get("priority_score",0), reverse=True)
-            return decisions
-        except Exception as e:
-            return [{"error": str(e), "product":"Error","action":"Monitor",
-                     "urgency":"Low","headline":"AI analysis failed",
-                     "reasoning":f"Could not generate decisions: {e}",
-                     "expected_impact":"","metric_stock":0,"metric_demand":0,
-                     "metric_price_gap":0,"priority_score":0,"tags":[],"category":""}]
+    @staticmethod
+    def _parse_decisions(raw: str) -> list:
+        data = orjson.loads(raw)
+        decisions = data.get("decisions", [])
+        # sort by priority
+        decisions.sort(key=lambda x: x.get("priority_score",0), reverse=True)
+        return decisions
+
+    @staticmethod
+    def _decisions_error(e: Exception) -> list:
+        return [{"error": str(e), "product":"Error","action":"Monitor",
+                 "urgency":"Low","headline":"AI analysis failed",
+                 "reasoning":f"Could not generate decisions: {e}",
+                 "expected_impact":"","metric_stock":0,"metric_demand":0,
+                 "metric_price_gap":0,"priority_score":0,"tags":[],"category":""}]
 
     # ═════════════════════════════════════════════════════════════════════════
     # 2. AI INSIGHTS
     # ═════════════════════════════════════════════════════════════════════════
-    def generate_insights(self, df: pd.DataFrame) -> dict:
-        context = self._build_product_context(df)
+    def generate_insights(self, df: pd.DataFrame, prod=None, sid=None) -> dict:
+        context = self._build_product_context(df, prod, sid=sid)
+        try:
+            raw = self._call(*self._insights_prompt(context), max_tokens=3000, heavy=True)
+            return orjson.loads(raw)
+        except Exception as e:
+            return self._insights_error(e)
 
+    async def _ainsights(self, client, context: str) -> dict:
+        try:
+            raw = await self._acall(client, *self._insights_prompt(context), max_tokens=3000, heavy=True)
+            return orjson.loads(raw)
+        except Exception as e:
+            return self._insights_error(e)
+
+    @staticmethod
+    def _insights_prompt(context: str) -> tuple:
         system = textwrap.dedent("""
             You are a senior retail business consultant AI.
             Analyze the retail store data provided and return a comprehensive 
@@ -171,22 +301,53 @@ class AIEngine:
         """).strip()
 
         user = f"Generate a full business intelligence report for this retail store:\n\n{context}"
+        return system, user
 
+    @staticmethod
+    def _insights_error(e: Exception) -> dict:
+        return {"error": str(e), "health_score": 0, "health_label":"Error",
+                "executive_summary": f"Insights generation failed: {e}",
+                "risks":[], "opportunities":[], "actions":[], "category_insights":[],
+                "top_products":[], "at_risk_products":[], "revenue_opportunity":""}
+
+    # ═════════════════════════════════════════════════════════════════════════
+    # 2b. DECISIONS + INSIGHTS BUNDLE
+    # ═════════════════════════════════════════════════════════════════════════
+    def generate_bundle(self, df: pd.DataFrame, prod=None, sid=None) -> dict:
+        """Both reports from one shared context; latency is the slower call, not the sum."""
+        context = self._build_product_context(df, prod, sid=sid)
+        decisions, insights = asyncio.run(self._abundle(context))
+        return {"decisions": decisions, "insights": insights}
+
+    async def _abundle(self, context: str):
+        # a fresh async client per run: its connection pool is bound to this event loop
+        client = AsyncGroq(api_key=self._key) if self._key else None
         try:
-            raw  = self._call(system, user, max_tokens=3000, heavy=True)
-            data = json.loads(raw)
-            return data
-        except Exception as e:
-            return {"error": str(e), "health_score": 0, "health_label":"Error",
-                    "executive_summary": f"Insights generation failed: {e}",
-                    "risks":[], "opportunities":[], "actions":[], "category_insights":[],
-                    "top_products":[], "at_risk_products":[], "revenue_opportunity":""}
+            return await asyncio.gather(self._adecisions(client, context),
+                                        self._ainsights(client, context))
+        finally:
+            if client is not None:
+                await client.close()
 
     # ═════════════════════════════════════════════════════════════════════════
     # 3. COPILOT
     # ═════════════════════════════════════════════════════════════════════════
-    def copilot(self, question: str, df: pd.DataFrame) -> dict:
-        context = self._build_product_context(df, max_products=80)
+    def copilot(self, question: str, df: pd.DataFrame, prod=None, sid=None) -> dict:
+        # repeat questions over the same upload are answered from cache
+        key = (sid, len(df), re.sub(r"\s+", " ", question.lower().strip()))
+        hit = self._answers.get(key) if sid else None
+        if hit and time.monotonic() - hit[0] < _ANSWER_TTL:
+            self._answers.move_to_end(key)
+            return hit[1]
+
+        if prod is None:
+            prod = product_summary(df)
+        # a question about specific products leads with their rows and, unless it
+        # compares against the wider catalogue, sends only a short list of top sellers
+        named   = self._mentioned_products(question, prod, sid)
+        rows    = 80 if not named or _COMPARE.search(question.lower()) else len(named) + _FOCUS_ROWS
+        context = self._build_product_context(df, prod, max_products=rows, sid=sid,
+                                              first=named or None)
 
         system = textwrap.dedent("""
             You are RetailMind, an expert AI assistant for retail shop owners.
@@ -221,8 +382,7 @@ class AIEngine:
 
         try:
             raw  = self._call(system, user, max_tokens=1500)
-            data = json.loads(raw)
-            return data
+            data = orjson.loads(raw)
         except Exception as e:
             return {
                 "answer": f"I had trouble processing that. Could you rephrase? (Error: {e})",
@@ -230,3 +390,9 @@ class AIEngine:
                 "table": None,
                 "follow_up": ["What are my top selling products?", "What needs restocking?"]
             }
+        if sid:
+            self._answers[key] = (time.monotonic(), data)
+            self._answers.move_to_end(key)
+            while len(self._answers) > _ANSWER_CACHE:
+                self._answers.popitem(last=False)
+        return data
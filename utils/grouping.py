@@ -0,0 +1,50 @@
+"""
+Single-pass group aggregation
+=============================
+Drop-in for the named-aggregation form of df.groupby(key).agg(...) used by
+the product-level summaries. The key is factorized once; every "sum"/"mean"
+is then a single np.bincount over the integer codes (no per-column sort or
+hash pass). Other reductions ("first", "median", ...) fall back to a
+groupby on the integer codes.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def group_codes(keys: pd.Series):
+    """(codes, uniques) with uniques sorted like groupby; null keys get code -1.
+    Index an array of per-group results with `codes` to broadcast back to rows."""
+    return pd.factorize(keys, sort=True)
+
+
+def group_agg(df: pd.DataFrame, key: str, *, codes=None, **spec) -> pd.DataFrame:
+    """group_agg(df, "Product", sold=("Units_Sold","sum"), ...)
+
+    Returns one row per key (sorted like groupby), key as a column —
+    the same frame as df.groupby(key).agg(**spec).reset_index().
+    Rows with a null key are dropped and NaNs are skipped, as in pandas.
+    Pass codes=group_codes(df[key]) to reuse an existing factorization.
+    """
+    codes, uniques = codes if codes is not None else group_codes(df[key])
+    ngroups = len(uniques)
+    ok = codes >= 0
+    c  = codes[ok]
+
+    out = {key: np.asarray(uniques)}
+    for name, (col, how) in spec.items():
+        src = df[col]
+        if how in ("sum", "mean"):
+            v     = src.to_numpy(dtype=np.float64, na_value=np.nan)[ok]
+            valid = ~np.isnan(v)
+            res   = np.bincount(c, weights=np.where(valid, v, 0.), minlength=ngroups)
+            if how == "mean":
+                cnt = np.bincount(c, weights=valid.astype(np.float64), minlength=ngroups)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    res = res / cnt
+            elif pd.api.types.is_integer_dtype(src.dtype):
+                res = res.astype(np.int64)
+            out[name] = res
+        else:
+            out[name] = pd.Series(src.to_numpy()[ok]).groupby(c).agg(how).to_numpy()
+    return pd.DataFrame(out)
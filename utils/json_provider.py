@@ -0,0 +1,36 @@
+"""
+orjson-backed Flask JSON provider
+=================================
+Installed as app.json so jsonify() and request.get_json() go through orjson.
+NumPy arrays/scalars serialize natively; anything orjson doesn't know
+(dates, Decimal, UUID, ...) falls back to Flask's default handling.
+NaN/inf become null, so responses are always valid JSON.
+"""
+
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+_OPTS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    def _opts(self, **kwargs) -> int:
+        opts = _OPTS
+        if kwargs.get("sort_keys", self.sort_keys):
+            opts |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            opts |= orjson.OPT_INDENT_2
+        return opts
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default, option=self._opts(**kwargs)).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj    = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        body   = orjson.dumps(obj, default=self.default,
+                              option=self._opts(indent=pretty) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)